@@ -1,19 +1,34 @@
-from flask import Flask, render_template, request, send_file, session, redirect, url_for, jsonify, flash, make_response
+from flask import Flask, Response, g, render_template, request, session, redirect, url_for, jsonify, flash, make_response, stream_with_context
 import pandas as pd
-import plotly.graph_objects as go
 import os
+import re
 from werkzeug.utils import secure_filename
+import csv
 import io
+import itertools
 import tempfile
 import logging
 import time
 import threading
-import uuid
+import hashlib
+import multiprocessing
 import numpy as np
+from collections import Counter, OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from urllib.parse import quote
 
-# Import report generator
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow is optional; uploads fall back to pandas' C parser
+    pa = None
+
+# Import forecasting and report generation
+from forecast import DEFAULT_PRODUCTS, forecast_demand
 from report_generator import generate_pdf_report
+from utils import ensure_private_dir
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -29,101 +44,533 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload size
 
 # Initialize a cache for recently uploaded datasets
 class DatasetCache:
+    """Thread-safe LRU cache.
+    
+    Reads take no lock: a single OrderedDict lookup or reorder is atomic under
+    the GIL, so concurrent requests never wait on each other in get(). Only
+    set() and discard_where(), which insert or evict entries, hold the lock,
+    and only for the O(1) dictionary updates themselves.
+    """
     def __init__(self, max_size=5):
-        self.cache = {}
+        self.cache = OrderedDict()
         self.max_size = max_size
         self.lock = threading.Lock()
     
     def get(self, key):
-        with self.lock:
-            return self.cache.get(key)
+        value = self.cache.get(key)
+        if value is not None:
+            # Mark as most recently used; a concurrent eviction may have removed it
+            try:
+                self.cache.move_to_end(key)
+            except KeyError:
+                pass
+        return value
     
     def set(self, key, value):
         with self.lock:
-            if len(self.cache) >= self.max_size:
-                # Remove oldest item when cache is full
-                oldest = list(self.cache.keys())[0]
-                del self.cache[oldest]
+            if key in self.cache:
+                self.cache.move_to_end(key)
+            elif len(self.cache) >= self.max_size:
+                # Remove least recently used item when cache is full
+                self.cache.popitem(last=False)
             self.cache[key] = value
+    
+    def discard_where(self, predicate):
+        """Removes every entry whose key satisfies predicate."""
+        # Snapshot the keys so lock-free reordering in get() can't interrupt iteration
+        keys = [key for key in list(self.cache) if predicate(key)]
+        with self.lock:
+            for key in keys:
+                self.cache.pop(key, None)
 
 dataset_cache = DatasetCache()
 
-# Forecasting cache for performance optimization
-forecast_cache = {}
+# Forecasting cache for performance optimization, keyed by (product, days, dataset key)
+forecast_cache = DatasetCache(max_size=128)
+
+# Rendered dashboard chart HTML, keyed by (dataset key, products plotted)
+plot_cache = DatasetCache(max_size=16)
+
+# Dataset key used for forecasts of the bundled default dataset
+DEFAULT_DATASET_KEY = '__default__'
+
+# Upper bound on worker processes used to forecast products in parallel
+FORECAST_WORKERS = min(8, os.cpu_count() or 1)
+
+# SARIMAX fits are CPU-bound Python, so batches run in worker processes to
+# sidestep the GIL; workers start on first use and are reused across requests.
+# They are started from a fork server (or spawned) rather than forked from
+# the threaded web server
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    FORECAST_MP_CONTEXT = multiprocessing.get_context('forkserver')
+    # Workers fork from a server that has already loaded the forecasting module
+    FORECAST_MP_CONTEXT.set_forkserver_preload(['forecast'])
+else:
+    FORECAST_MP_CONTEXT = multiprocessing.get_context('spawn')
+forecast_executor = None
+forecast_executor_lock = threading.Lock()
+
+def get_forecast_executor():
+    """Returns the forecast worker pool, creating it on first use."""
+    global forecast_executor
+    with forecast_executor_lock:
+        if forecast_executor is None:
+            forecast_executor = ProcessPoolExecutor(max_workers=FORECAST_WORKERS,
+                                                    mp_context=FORECAST_MP_CONTEXT)
+        return forecast_executor
+
+def replace_broken_executor(executor):
+    """Discards a pool broken by a dead worker, so the next request starts a new one."""
+    global forecast_executor
+    with forecast_executor_lock:
+        if forecast_executor is executor:
+            forecast_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+# Columns every dataset must provide
+REQUIRED_COLUMNS = frozenset({'Date', 'Product', 'Demand', 'Inventory'})
+
+# Uploads are parsed and validated in chunks to bound peak memory
+UPLOAD_CHUNK_ROWS = 200_000
+UPLOAD_BLOCK_SIZE = 8 * 1024 * 1024  # bytes per pyarrow read block
+
+# Validated uploads are also saved here as Parquet, so any worker process can
+# reload a session's dataset after it leaves (or never entered) its memory cache.
+# The directory is private to the user running the app
+DATASET_STORE_DIR = os.environ.get(
+    "DATASET_STORE_DIR",
+    os.path.join(tempfile.gettempdir(), f"forecast_uploads-{os.getuid() if hasattr(os, 'getuid') else 'user'}")
+)
+
+# Stored uploads not used for this long are deleted
+DATASET_STORE_MAX_AGE = int(os.environ.get("DATASET_STORE_MAX_AGE", 24 * 60 * 60))  # seconds
+
+# Upload cache IDs are hex BLAKE2b digests of the file; the session's ID is
+# only trusted, and only turned into a store path, if it has this form
+CACHE_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def preprocess_date_column(df):
-    """Attempts multiple date formats to convert the Date column."""
-    date_formats = ['%d-%m-%Y', '%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d']
+def detect_column_mapping(columns):
+    """Maps uploaded column names onto Date/Product/Demand/Inventory (case-insensitive)."""
+    rename_map = {}
+    for col in columns:
+        col_lower = col.lower()
+        if 'product' in col_lower or 'item' in col_lower:
+            rename_map[col] = 'Product'
+        elif 'demand' in col_lower or 'sales' in col_lower or 'unit' in col_lower:
+            rename_map[col] = 'Demand'
+        elif 'inventory' in col_lower or 'stock' in col_lower:
+            rename_map[col] = 'Inventory'
+        elif 'date' in col_lower:
+            rename_map[col] = 'Date'
+    return rename_map
+
+def iter_uploaded_csv(file_bytes):
+    """Reads an uploaded CSV in chunks, renaming columns to the expected names.
+
+    Only the required columns are read, and Product is read as a category.
+    With pyarrow available the file is streamed through its multithreaded
+    reader, which types Demand and Inventory during the read (whole numbers
+    stay integers, as with pandas). Date is read as text: pyarrow would try
+    every accepted format on each value separately and read ambiguous
+    day-first dates month-first, so validation parses it with a single
+    format per upload. If pyarrow rejects a block (e.g. non-numeric demand
+    after the first block), the remaining rows are re-read with pandas so
+    validation can report the problem. Chunks are indexed by their 0-based
+    data row in the file.
+    """
+    header = pd.read_csv(io.BytesIO(file_bytes), nrows=0).columns
+    rename_map = detect_column_mapping(header)
+    source_columns = {rename_map.get(col, col): col for col in header}
+    use_columns = [col for col in header if rename_map.get(col, col) in REQUIRED_COLUMNS]
+    rows_read = 0
     
-    for fmt in date_formats:
+    if pa is not None:
+        target_types = {
+            'Date': pa.string(),
+            'Product': pa.dictionary(pa.int32(), pa.string())
+        }
+        column_types = {source_columns[target]: arrow_type
+                        for target, arrow_type in target_types.items()
+                        if target in source_columns}
         try:
-            df['Date'] = pd.to_datetime(df['Date'], format=fmt)
-            logger.info(f"Successfully parsed dates using format: {fmt}")
-            return df, None
-        except Exception as e:
-            continue
+            reader = pa_csv.open_csv(
+                pa.BufferReader(file_bytes),
+                read_options=pa_csv.ReadOptions(block_size=UPLOAD_BLOCK_SIZE),
+                convert_options=pa_csv.ConvertOptions(
+                    column_types=column_types,
+                    include_columns=use_columns
+                )
+            )
+            for batch in reader:
+                chunk = batch.to_pandas()
+                # Number rows across batches, so errors can name the data row
+                chunk.index = pd.RangeIndex(rows_read, rows_read + len(chunk))
+                rows_read += len(chunk)
+                yield chunk.rename(columns=rename_map) if rename_map else chunk
+            return
+        except pa.ArrowInvalid as e:
+            logger.info(f"pyarrow could not parse upload after {rows_read} rows, falling back to pandas: {str(e)}")
     
-    # If all formats fail, try pandas' flexible parser
-    try:
-        df['Date'] = pd.to_datetime(df['Date'])
-        logger.info("Successfully parsed dates using pandas' flexible parser")
+    # Skip data rows already yielded by pyarrow (row 0 is the header)
+    reader = pd.read_csv(
+        io.BytesIO(file_bytes),
+        usecols=use_columns,
+        dtype={source_columns['Product']: 'category'} if 'Product' in source_columns else None,
+        skiprows=range(1, rows_read + 1),
+        chunksize=UPLOAD_CHUNK_ROWS
+    )
+    for chunk in reader:
+        chunk.index += rows_read
+        yield chunk.rename(columns=rename_map) if rename_map else chunk
+
+# Date formats accepted in uploaded datasets, tried in order
+DATE_FORMATS = ['%d-%m-%Y', '%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d']
+
+def detect_date_format(dates):
+    """Returns the accepted date format that parses the most distinct dates.
+    
+    Every distinct value is tried, so a day-first column is recognised as soon
+    as one day exceeds 12. Ties go to the earlier entry in DATE_FORMATS.
+    Returns None if no format parses any value.
+    """
+    values = pd.Series(dates.dropna().unique())
+    if values.empty:
+        return None
+    hit_counts = {fmt: int(pd.to_datetime(values, format=fmt, errors='coerce').notna().sum())
+                  for fmt in DATE_FORMATS}
+    best_format = max(hit_counts, key=hit_counts.get)
+    return best_format if hit_counts[best_format] else None
+
+def preprocess_date_column(df, date_format=None):
+    """Converts the Date column using a single date format for the whole column.
+    
+    date_format is the format chosen for earlier chunks of the same upload;
+    without one, it is detected from this chunk. Day-first and month-first
+    readings are never mixed: rows the chosen format can't parse are reported.
+    """
+    if pd.api.types.is_datetime64_any_dtype(df['Date']):
         return df, None
-    except Exception as e:
-        return df, f"Failed to parse date column: {str(e)}"
+    
+    if date_format is None:
+        date_format = detect_date_format(df['Date'])
+    
+    # One vectorized pass; cache=True converts each distinct date string once.
+    # If none of the accepted formats matched, pandas infers one format for the column
+    if date_format:
+        logger.info(f"Parsing dates using format: {date_format}")
+        parsed_dates = pd.to_datetime(df['Date'], format=date_format, errors='coerce', cache=True)
+    else:
+        parsed_dates = pd.to_datetime(df['Date'], errors='coerce', cache=True)
+    
+    # Genuinely missing dates are reported by the missing-values check in validate_dataset
+    failed = parsed_dates.isna() & df['Date'].notna()
+    unparsed_count = int(failed.sum())
+    if unparsed_count:
+        failed_rows = df.loc[failed, 'Date'].head(5)
+        examples = ", ".join(f"row {index + 1} ('{value}')" for index, value in failed_rows.items())
+        expected = f" as {date_format}" if date_format else ""
+        return df, (f"Failed to parse date column{expected}: {unparsed_count} value(s) "
+                    f"could not be parsed, e.g. {examples}")
+    
+    df['Date'] = parsed_dates
+    return df, None
 
-def validate_dataset(df):
-    """Validates that the dataset has the required columns and formats."""
-    required_columns = {'Date', 'Product', 'Demand', 'Inventory'}
+def validate_chunk(df, date_format=None):
+    """Validates one chunk of a dataset and converts its columns to the expected types.
     
+    date_format is passed on to preprocess_date_column.
+    """
     # Check for missing columns
-    if not required_columns.issubset(df.columns):
-        missing = required_columns - set(df.columns)
-        return False, f"Missing required columns: {', '.join(missing)}"
+    missing = REQUIRED_COLUMNS - frozenset(df.columns)
+    if missing:
+        return False, f"Missing required columns: {', '.join(sorted(missing))}"
     
     # Process date column
-    df, date_error = preprocess_date_column(df)
+    df, date_error = preprocess_date_column(df, date_format)
     if date_error:
         return False, date_error
     
-    # Convert numeric columns
+    # Convert numeric columns (already numeric when read through pyarrow)
     try:
-        df['Demand'] = pd.to_numeric(df['Demand'])
-        df['Inventory'] = pd.to_numeric(df['Inventory'])
+        for col in ('Demand', 'Inventory'):
+            if not pd.api.types.is_numeric_dtype(df[col]):
+                df[col] = pd.to_numeric(df[col])
     except Exception as e:
         return False, f"Error converting numeric columns: {str(e)}"
     
     # Check for missing values
-    missing_values = df[list(required_columns)].isnull().sum()
+    missing_values = df[list(REQUIRED_COLUMNS)].isnull().sum()
     if missing_values.sum() > 0:
         missing_cols = ", ".join(f"{col} ({count} missing)" 
                               for col, count in missing_values.items() 
                               if count > 0)
         return False, f"Dataset contains missing values: {missing_cols}"
     
+    return True, df
+
+def validate_dataset(chunks):
+    """Validates that the dataset has the required columns and formats.
+    
+    Accepts a DataFrame or an iterable of DataFrame chunks. Chunks are
+    validated as they arrive, so a bad file fails without being fully
+    loaded; they are only concatenated once every check has passed.
+    """
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+    
+    validated_chunks = []
+    product_counts = Counter()
+    date_format = None
+    for chunk in chunks:
+        # The first chunk's date format is used for the whole upload
+        if (date_format is None and 'Date' in chunk.columns
+                and not pd.api.types.is_datetime64_any_dtype(chunk['Date'])):
+            date_format = detect_date_format(chunk['Date'])
+        valid, result = validate_chunk(chunk, date_format)
+        if not valid:
+            return False, result
+        chunk_counts = result['Product'].value_counts(sort=False)
+        # Categorical chunks also report unused categories, with a count of zero
+        product_counts.update(chunk_counts[chunk_counts > 0].to_dict())
+        validated_chunks.append(result)
+    
+    if not product_counts:
+        return False, "Dataset contains no data rows"
+    
     # Ensure there are enough data points for each product
-    products = df['Product'].unique()
-    for product in products:
-        product_data = df[df['Product'] == product]
-        if len(product_data) < 10:  # Minimum data points needed for forecasting
-            return False, f"Not enough data points for product '{product}'. At least 10 required, got {len(product_data)}."
+    counts = pd.Series(product_counts)
+    insufficient = counts[counts < 10]  # Minimum data points needed for forecasting
+    if not insufficient.empty:
+        product, count = insufficient.index[0], int(insufficient.iloc[0])
+        return False, f"Not enough data points for product '{product}'. At least 10 required, got {count}."
+    
+    if len(validated_chunks) == 1:
+        df = validated_chunks[0]
+    else:
+        df = pd.concat(validated_chunks, ignore_index=True)
     
-    # Standardize date format to the model's expected format
-    df['Date'] = df['Date'].dt.strftime('%d-%m-%Y')
+    # Product is a low-cardinality label; categorical codes make filters and groupbys integer ops.
+    # Chunks may arrive with their own categories, so settle on one sorted set
+    df['Product'] = pd.Categorical(df['Product'], categories=sorted(product_counts))
     
     return True, df
 
-# Load default dataset and get unique products
-try:
-    data = pd.read_csv("demand_inventory.csv")
-    data['Date'] = pd.to_datetime(data['Date'], format='%d-%m-%Y')
-    products = sorted(data['Product'].unique())
-except Exception as e:
-    logger.error(f"Error loading default dataset: {str(e)}")
-    data = pd.DataFrame(columns=['Date', 'Product', 'Demand', 'Inventory'])
-    products = []
+def get_cached_forecast(product, days, dataset_key, df=None):
+    """Returns the forecast for product, reusing a cached result for the same dataset.
+    
+    dataset_key identifies the data the forecast is built from: the upload's
+    cache ID, or DEFAULT_DATASET_KEY for the default dataset (df=None).
+    Cached results are shared, so callers must not modify them. The views
+    render their own charts, so results carry no plot_json.
+    """
+    key = (product, days, dataset_key)
+    result = forecast_cache.get(key)
+    if result is None:
+        if df is not None:
+            result = forecast_demand(product, days, data=df, return_plot=False)
+        else:
+            result = forecast_demand(product, days, return_plot=False)
+        forecast_cache.set(key, result)
+    return result
+
+def build_dataset_entry(df):
+    """Bundles a validated dataset with the views derived from it for caching.
+    
+    The upload page's preview rows and the sorted product list (plus a set
+    for membership checks) are pure functions of the dataset, so they are
+    computed once here instead of on every request.
+    The preview is JSON records, rendered into a table client-side.
+    """
+    preview = df.head(5).assign(Date=lambda rows: rows['Date'].dt.strftime('%Y-%m-%d'))
+    products = df['Product'].cat.categories.tolist()
+    return {
+        'df': df,
+        'preview_json': preview.to_json(orient='records'),
+        'products': products,
+        'products_set': frozenset(products)
+    }
+
+def is_valid_cache_id(cache_id):
+    """Returns True if cache_id has the form of an upload's cache ID."""
+    return isinstance(cache_id, str) and CACHE_ID_PATTERN.fullmatch(cache_id) is not None
+
+def session_cache_id():
+    """Returns this session's upload cache ID, or None if it has no valid one."""
+    cache_id = session.get('uploaded_dataset_id')
+    return cache_id if is_valid_cache_id(cache_id) else None
+
+def dataset_store_path(cache_id):
+    """Returns the Parquet path an upload with this cache ID is stored at."""
+    if not is_valid_cache_id(cache_id):
+        raise ValueError(f"Invalid dataset cache ID: {cache_id!r}")
+    return os.path.join(DATASET_STORE_DIR, f"{cache_id}.parquet")
+
+def ensure_dataset_store():
+    """Creates the dataset store directory, refusing one other users can access."""
+    ensure_private_dir(DATASET_STORE_DIR)
+
+def prune_dataset_store():
+    """Deletes stored datasets that have not been written or read for DATASET_STORE_MAX_AGE."""
+    cutoff = time.time() - DATASET_STORE_MAX_AGE
+    try:
+        with os.scandir(DATASET_STORE_DIR) as entries:
+            for entry in entries:
+                if entry.name.endswith(('.parquet', '.tmp')) and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+    except OSError as e:
+        logger.warning(f"Could not prune dataset store: {str(e)}")
+
+def store_dataset(cache_id, df):
+    """Saves a validated dataset as Parquet; failures only cost the on-disk copy.
+    
+    The file is written under a temporary name and renamed into place, so
+    readers never see a partial file.
+    """
+    try:
+        ensure_dataset_store()
+        prune_dataset_store()
+        with tempfile.NamedTemporaryFile(dir=DATASET_STORE_DIR, suffix='.tmp', delete=False) as tmp:
+            tmp_path = tmp.name
+        try:
+            df.to_parquet(tmp_path, compression='snappy', index=False)
+            os.replace(tmp_path, dataset_store_path(cache_id))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    except (OSError, ImportError) as e:
+        logger.warning(f"Could not store dataset {cache_id} as Parquet: {str(e)}")
+
+def load_dataset_entry(cache_id):
+    """Returns the cached entry for an upload, reloading it from Parquet if needed.
+    
+    Returns None if the dataset is in neither the memory cache nor the store,
+    or if cache_id is not a valid cache ID.
+    """
+    if not is_valid_cache_id(cache_id):
+        return None
+    entry = dataset_cache.get(cache_id)
+    if entry is not None:
+        return entry
+    
+    path = dataset_store_path(cache_id)
+    try:
+        df = pd.read_parquet(path)
+        # Reading a dataset keeps it from expiring
+        os.utime(path)
+    except (OSError, ImportError, ValueError):
+        return None
+    entry = build_dataset_entry(df)
+    dataset_cache.set(cache_id, entry)
+    return entry
+
+def submit_forecast(product, days, product_df):
+    """Submits a forecast to the worker pool, replacing the pool once if it is broken.
+    
+    Returns (executor, future), so a later failure can be traced to its pool.
+    """
+    executor = get_forecast_executor()
+    try:
+        return executor, executor.submit(forecast_demand, product, days, product_df,
+                                         return_plot=False)
+    except BrokenProcessPool:
+        replace_broken_executor(executor)
+        executor = get_forecast_executor()
+        return executor, executor.submit(forecast_demand, product, days, product_df,
+                                         return_plot=False)
+
+def iter_product_forecasts(use_products, days, dataset_key, df=None):
+    """Forecasts several products concurrently, yielding results as they become available.
+    
+    Yields (product, result) tuples in the order of use_products. Cached
+    results are reused; the rest are computed in the forecast worker pool,
+    each worker receiving only its product's rows. If a worker dies, the pool
+    is replaced and the affected products are forecast in this process.
+    Products whose forecast fails are logged and left out.
+    """
+    cached = {}
+    for product in use_products:
+        result = forecast_cache.get((product, days, dataset_key))
+        if result is not None:
+            cached[product] = result
+    
+    pending = {}
+    if df is not None and len(cached) < len(use_products):
+        # Split the dataset by product in one pass instead of filtering it per product
+        product_frames = dict(tuple(df.groupby('Product', observed=True, sort=False)))
+    for product in use_products:
+        if product in cached:
+            continue
+        # A product without rows gets an empty frame, so its forecast fails as before
+        product_df = product_frames.get(product, df.iloc[:0]) if df is not None else None
+        pending[product] = (*submit_forecast(product, days, product_df), product_df)
+    
+    for product in use_products:
+        if product in cached:
+            yield product, cached[product]
+            continue
+        executor, future, product_df = pending[product]
+        try:
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                logger.error(f"Forecast worker died, forecasting {product} in-process: {str(e)}")
+                replace_broken_executor(executor)
+                result = forecast_demand(product, days, product_df, return_plot=False)
+        except Exception as e:
+            logger.error(f"Error forecasting for {product}: {str(e)}")
+            continue
+        forecast_cache.set((product, days, dataset_key), result)
+        yield product, result
+
+def forecast_products(use_products, days, dataset_key, df=None):
+    """Forecasts several products concurrently, returning a list of (product, result) tuples."""
+    return list(iter_product_forecasts(use_products, days, dataset_key, df))
+
+def csv_download_response(chunks, filename):
+    """Streams CSV text chunks to the client as a file download."""
+    response = Response(stream_with_context(chunks), mimetype='text/csv')
+    try:
+        filename.encode('ascii')
+        response.headers.set('Content-Disposition', 'attachment', filename=filename)
+    except UnicodeEncodeError:
+        response.headers.set('Content-Disposition', 'attachment',
+                             **{'filename*': f"UTF-8''{quote(filename)}"})
+    return response
+
+# Products of the default dataset, which forecast.py loads and indexes at import
+products = DEFAULT_PRODUCTS
+
+# The dataset a request works with: df is None for the default dataset
+ActiveDataset = namedtuple('ActiveDataset', ['df', 'products', 'products_set', 'key', 'source'])
+
+DEFAULT_DATASET = ActiveDataset(None, products, frozenset(products), DEFAULT_DATASET_KEY, "Default Dataset")
+
+class DatasetUnavailableError(Exception):
+    """Raised when the session's uploaded dataset is no longer cached or stored."""
+
+def get_active_dataset():
+    """Returns the uploaded dataset for this session, or the default dataset.
+    
+    The lookup is memoized on flask.g so it runs once per request. Raises
+    DatasetUnavailableError if the session's upload is no longer cached.
+    """
+    if 'active_dataset' in g:
+        return g.active_dataset
+    
+    cache_id = session_cache_id()
+    if cache_id:
+        entry = load_dataset_entry(cache_id)
+        if entry is None:
+            raise DatasetUnavailableError("Uploaded dataset no longer available. Please upload again.")
+        g.active_dataset = ActiveDataset(
+            entry['df'], entry['products'], entry['products_set'], cache_id, "Uploaded Dataset"
+        )
+    else:
+        g.active_dataset = DEFAULT_DATASET
+    return g.active_dataset
 
 @app.route("/", methods=["GET"])
 def index():
@@ -152,44 +599,28 @@ def upload():
                     filename = secure_filename(file.filename)
                     logger.info(f"Processing uploaded file: {filename}")
                     
-                    # Read the file
-                    df = pd.read_csv(file)
-                    
-                    # Preprocess column names (case-insensitive mapping)
-                    rename_map = {}
-                    for col in df.columns:
-                        col_lower = col.lower()
-                        if 'product' in col_lower or 'item' in col_lower:
-                            rename_map[col] = 'Product'
-                        elif 'demand' in col_lower or 'sales' in col_lower or 'unit' in col_lower:
-                            rename_map[col] = 'Demand'
-                        elif 'inventory' in col_lower or 'stock' in col_lower:
-                            rename_map[col] = 'Inventory'
-                        elif 'date' in col_lower:
-                            rename_map[col] = 'Date'
-                    
-                    # Apply detected column mappings
-                    if rename_map:
-                        df = df.rename(columns=rename_map)
-                    
-                    # Validate the dataset
-                    valid, result = validate_dataset(df)
+                    # Read the file; identical uploads hash to the same cache entry
+                    file_bytes = file.read()
+                    cache_id = hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+                    entry = load_dataset_entry(cache_id)
+                    if entry is not None:
+                        logger.info(f"Reusing cached dataset for identical upload: {cache_id}")
+                        valid = True
+                    else:
+                        # Parse and validate the dataset chunk by chunk
+                        valid, result = validate_dataset(iter_uploaded_csv(file_bytes))
+                        if valid:
+                            entry = build_dataset_entry(result)
+                            store_dataset(cache_id, result)
                     
                     if valid:
-                        # Generate a unique ID for this dataset
-                        cache_id = str(uuid.uuid4())
-                        # Store validated dataframe in cache
-                        dataset_cache.set(cache_id, result)
+                        # Store validated dataset and its preview in cache
+                        dataset_cache.set(cache_id, entry)
                         session['uploaded_dataset_id'] = cache_id
                         
-                        # Create preview data
-                        preview_data = result.head(5).to_html(
-                            classes="table table-striped table-hover", 
-                            index=False
-                        )
-                        
-                        upload_products = sorted(result['Product'].unique())
-                        success_message = f"Dataset successfully processed with {len(result)} rows and {len(upload_products)} products"
+                        preview_data = entry['preview_json']
+                        upload_products = entry['products']
+                        success_message = f"Dataset successfully processed with {len(entry['df'])} rows and {len(upload_products)} products"
                     else:
                         error_message = result
                         
@@ -201,16 +632,13 @@ def upload():
     
     # If we have a dataset in the session, retrieve it for preview
     elif 'uploaded_dataset_id' in session:
-        cache_id = session['uploaded_dataset_id']
-        cached_df = dataset_cache.get(cache_id)
+        # load_dataset_entry ignores malformed cache IDs
+        entry = load_dataset_entry(session['uploaded_dataset_id'])
         
-        if cached_df is not None:
-            preview_data = cached_df.head(5).to_html(
-                classes="table table-striped table-hover",
-                index=False
-            )
-            upload_products = sorted(cached_df['Product'].unique())
-            success_message = f"Using previously uploaded dataset with {len(cached_df)} rows and {len(upload_products)} products"
+        if entry is not None:
+            preview_data = entry['preview_json']
+            upload_products = entry['products']
+            success_message = f"Using previously uploaded dataset with {len(entry['df'])} rows and {len(upload_products)} products"
     
     return render_template(
         "upload.html", 
@@ -233,44 +661,20 @@ def predict():
         
         logger.info(f"Forecasting for product: {product}, days: {days}")
         
-        # Check if we should use an uploaded dataset
-        if 'uploaded_dataset_id' in session:
-            cache_id = session['uploaded_dataset_id']
-            logger.info(f"Using uploaded dataset with ID: {cache_id}")
-            
-            df = dataset_cache.get(cache_id)
-            if df is None:
-                return render_template("error.html", 
-                    error_message="Uploaded dataset no longer available. Please upload again.")
-            
-            # Verify product exists in the dataset
-            if product not in df['Product'].unique():
-                return render_template("error.html", 
-                    error_message=f"Selected product '{product}' not found in uploaded dataset")
-            
-            # Ensure Date is in datetime format for the forecasting function
-            df['Date'] = pd.to_datetime(df['Date'], format='%d-%m-%Y')
-            
-            # Use imported forecast_demand function
-            from forecast import forecast_demand
-            result = forecast_demand(product, days, data=df)
-        else:
-            # Use default dataset
-            from forecast import forecast_demand
-            result = forecast_demand(product, days)
+        dataset = get_active_dataset()
+        logger.info(f"Using {dataset.source} ({dataset.key})")
+        
+        # Verify product exists in the dataset
+        if product not in dataset.products_set:
+            return render_template("error.html", 
+                error_message=f"Selected product '{product}' not found in {dataset.source.lower()}")
+        
+        result = get_cached_forecast(product, days, dataset.key, dataset.df)
         
-        # Prepare CSV data
-        csv_data = ["Date,Value"]
+        # Prepare chart data; the CSV is streamed separately by download_forecast_csv
         historical_data = list(zip(result["historical_dates"], result["historical_values"]))
         forecast_data = list(zip(result["forecast_dates"], result["forecast_values"]))
         
-        for date, value in historical_data:
-            csv_data.append(f'"{date}",{value}')
-        for date, value in forecast_data:
-            csv_data.append(f'"{date}",{value}')
-            
-        csv_content = "\n".join(csv_data)
-        
         end_time = time.time()
         processing_time = round(end_time - start_time, 2)
         logger.info(f"Forecast completed in {processing_time} seconds")
@@ -286,9 +690,10 @@ def predict():
             total_cost=result["total_cost"],
             historical_data=historical_data,
             forecast_data=forecast_data,
-            csv_data=csv_content,
             processing_time=processing_time
         )
+    except DatasetUnavailableError as e:
+        return render_template("error.html", error_message=str(e))
     except Exception as e:
         logger.error(f"Error in predict route: {str(e)}")
         return render_template("error.html", error_message=str(e))
@@ -298,78 +703,50 @@ def dashboard():
     """Dashboard showing combined forecasts for all products."""
     try:
         # Determine which dataset to use
-        if 'uploaded_dataset_id' in session:
-            cache_id = session['uploaded_dataset_id']
-            df = dataset_cache.get(cache_id)
-            if df is None:
-                return render_template("error.html", 
-                    error_message="Uploaded dataset no longer available. Please upload again.")
-            
-            use_products = sorted(df['Product'].unique())
-            # Ensure Date is in datetime format
-            df['Date'] = pd.to_datetime(df['Date'], format='%d-%m-%Y')
-        else:
-            use_products = products
-            df = None
-        
-        # Prepare data for the dashboard
-        forecasts = []
-        demand_forecasts = []
-        
-        # Import forecasting function
-        from forecast import forecast_demand
+        dataset = get_active_dataset()
         
         # Generate forecasts for each product (with 30-day default horizon)
-        for product in use_products:
-            try:
-                if df is not None:
-                    f = forecast_demand(product, 30, data=df)
-                else:
-                    f = forecast_demand(product, 30)
-                
-                forecasts.append(f)
-                forecast_series = pd.Series(
-                    f["forecast_values"],
-                    index=f["forecast_dates"]
-                )
-                demand_forecasts.append((product, forecast_series))
-            except Exception as e:
-                logger.error(f"Error forecasting for {product}: {str(e)}")
-        
-        total_forecasted_demand = sum(sum(f["forecast_values"]) for f in forecasts)
-        inventory_levels = {product: f["order_quantity"] for product, f in zip(use_products, forecasts)}
-        
-        # Generate combined plot
-        fig = go.Figure()
-        for product, series in demand_forecasts:
-            series = series.sort_index()
-            fig.add_trace(go.Scatter(
-                x=series.index,
-                y=series.values,
-                mode='lines+markers',
-                name=product
-            ))
-        
-        fig.update_layout(
-            title="Forecasted Demand for All Products",
-            xaxis_title="Date",
-            yaxis_title="Forecasted Demand",
-            legend_title="Product",
-            width=1000,
-            height=600
-        )
-        
-        # Save plot to HTML string
-        plot_html = fig.to_html(full_html=False)
-        
-        # Get dataset source for UI display
-        dataset_source = "Uploaded Dataset" if 'uploaded_dataset_id' in session else "Default Dataset"
+        product_forecasts = forecast_products(dataset.products, 30, dataset.key, dataset.df)
+        
+        total_forecasted_demand = sum(f["forecast_sum"] for _, f in product_forecasts)
+        inventory_levels = {product: f["order_quantity"] for product, f in product_forecasts}
+        
+        # The chart only changes with the forecasts, so reuse its rendered HTML
+        plot_key = (dataset.key, tuple(product for product, _ in product_forecasts))
+        plot_html = plot_cache.get(plot_key)
+        if plot_html is None:
+            # Wide-form frame, one column per product; forecast_dates are ISO strings,
+            # already ascending, and align across products on their union
+            demand_forecasts = pd.DataFrame({
+                product: pd.Series(f["forecast_values"], index=f["forecast_dates"])
+                for product, f in product_forecasts
+            })
+            demand_forecasts.index.name = "Date"
+            demand_forecasts.columns.name = "Product"
+            
+            # Generate combined plot, all traces in one call (plotly loads on first use)
+            import plotly.express as px
+            fig = px.line(
+                demand_forecasts,
+                markers=True,
+                title="Forecasted Demand for All Products",
+                labels={'value': "Forecasted Demand"},
+                width=1000,
+                height=600
+            )
+            
+            # Save plot to HTML string with a script tag for the plotly.js build matching
+            # this plotly version; older bundles can't decode its binary-encoded traces
+            plot_html = fig.to_html(full_html=False, include_plotlyjs='cdn')
+            plot_cache.set(plot_key, plot_html)
         
         return render_template("dashboard.html", 
                            total_forecasted_demand=total_forecasted_demand,
                            inventory_levels=inventory_levels,
                            plot_html=plot_html,
-                           dataset_source=dataset_source)
+                           dataset_source=dataset.source)
+    except DatasetUnavailableError as e:
+        return render_template("error.html", error_message=str(e))
     except Exception as e:
         logger.error(f"Error in dashboard route: {str(e)}")
         return render_template("error.html", error_message=str(e))
@@ -377,71 +754,48 @@ def dashboard():
 @app.route("/clear_dataset", methods=["POST"])
 def clear_dataset():
     """Clear the uploaded dataset and return to default."""
-    if 'uploaded_dataset_id' in session:
-        del session['uploaded_dataset_id']
+    cache_id = session.pop('uploaded_dataset_id', None)
+    if is_valid_cache_id(cache_id):
+        # The dataset itself may be shared by identical uploads in other
+        # sessions; it is left to the cache and store expiry
+        forecast_cache.discard_where(lambda key: key[2] == cache_id)
+        plot_cache.discard_where(lambda key: key[0] == cache_id)
     return redirect(url_for('index'))
 
 @app.route("/download_forecast_csv/<product>/<int:days>")
 def download_forecast_csv(product, days):
     """Download forecast results as CSV file."""
     try:
-        # Determine which dataset to use
-        if 'uploaded_dataset_id' in session:
-            cache_id = session['uploaded_dataset_id']
-            df = dataset_cache.get(cache_id)
-            if df is None:
-                return render_template("error.html", 
-                    error_message="Uploaded dataset no longer available. Please upload again.")
-            
-            # Verify product exists in the dataset
-            if product not in df['Product'].unique():
-                return render_template("error.html", 
-                    error_message=f"Selected product '{product}' not found in uploaded dataset")
-            
-            # Ensure Date is in datetime format
-            df['Date'] = pd.to_datetime(df['Date'], format='%d-%m-%Y')
-            
-            # Import forecasting function
-            from forecast import forecast_demand
-            
-            # Generate forecast
-            result = forecast_demand(product, days, data=df)
-        else:
-            # Use default dataset
-            from forecast import forecast_demand
-            result = forecast_demand(product, days)
-        
-        # Create DataFrame from forecast results
-        historical_df = pd.DataFrame({
-            'Date': result["historical_dates"],
-            'Type': ['Historical'] * len(result["historical_dates"]),
-            'Value': result["historical_values"]
-        })
-        
-        forecast_df = pd.DataFrame({
-            'Date': result["forecast_dates"],
-            'Type': ['Forecast'] * len(result["forecast_dates"]),
-            'Value': result["forecast_values"]
-        })
-        
-        # Combine historical and forecast data
-        combined_df = pd.concat([historical_df, forecast_df])
-        
-        # Create a BytesIO object to store the CSV
-        csv_buffer = io.BytesIO()
-        combined_df.to_csv(csv_buffer, index=False, encoding='utf-8')
-        csv_buffer.seek(0)
+        # Verify product exists in the dataset
+        dataset = get_active_dataset()
+        if product not in dataset.products_set:
+            return render_template("error.html", 
+                error_message=f"Selected product '{product}' not found in {dataset.source.lower()}")
+        
+        # Generate forecast
+        result = get_cached_forecast(product, days, dataset.key, dataset.df)
+        
+        def generate():
+            # Historical rows then forecast rows, written straight from the result lists
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, lineterminator='\n')
+            writer.writerow(['Date', 'Type', 'Value'])
+            for label, dates, values in (
+                ('Historical', result["historical_dates"], result["historical_values"]),
+                ('Forecast', result["forecast_dates"], result["forecast_values"])
+            ):
+                writer.writerows(zip(dates, itertools.repeat(label), values))
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
         
         # Create a filename with date stamp
         today = datetime.now().strftime('%Y%m%d')
         filename = f"{product}_forecast_{today}.csv"
         
-        return send_file(
-            csv_buffer,
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=filename
-        )
+        return csv_download_response(generate(), filename)
+    except DatasetUnavailableError as e:
+        return render_template("error.html", error_message=str(e))
     except Exception as e:
         logger.error(f"Error generating CSV: {str(e)}")
         return render_template("error.html", error_message=str(e))
@@ -451,65 +805,34 @@ def download_all_forecasts():
     """Download forecasts for all products as a single CSV."""
     try:
         # Determine which dataset to use
-        from forecast import forecast_demand
+        dataset = get_active_dataset()
         
-        if 'uploaded_dataset_id' in session:
-            cache_id = session['uploaded_dataset_id']
-            df = dataset_cache.get(cache_id)
-            if df is None:
-                return render_template("error.html", 
-                    error_message="Uploaded dataset no longer available. Please upload again.")
-            
-            use_products = sorted(df['Product'].unique())
-            # Ensure Date is in datetime format
-            df['Date'] = pd.to_datetime(df['Date'], format='%d-%m-%Y')
-        else:
-            use_products = products
-            df = None
+        # Generate forecasts for each product; later products keep computing while earlier ones stream
+        forecasts = iter_product_forecasts(dataset.products, 30, dataset.key, dataset.df)
+        first = next(forecasts, None)
+        if first is None:
+            return render_template("error.html", error_message="No forecasts could be generated")
         
-        # Generate forecasts for each product
-        all_forecasts = []
+        def generate():
+            # Rows are written straight from the forecast lists; no per-product DataFrame
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, lineterminator='\n')
+            writer.writerow(['Date', 'Product', 'Forecast'])
+            for product, result in itertools.chain([first], forecasts):
+                writer.writerows(zip(result["forecast_dates"],
+                                     itertools.repeat(product),
+                                     result["forecast_values"]))
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
         
-        for product in use_products:
-            try:
-                if df is not None:
-                    result = forecast_demand(product, 30, data=df)
-                else:
-                    result = forecast_demand(product, 30)
-                
-                # Create DataFrame for this product's forecast
-                product_df = pd.DataFrame({
-                    'Date': result["forecast_dates"],
-                    'Product': [product] * len(result["forecast_dates"]),
-                    'Forecast': result["forecast_values"]
-                })
-                
-                all_forecasts.append(product_df)
-                
-            except Exception as e:
-                logger.error(f"Error forecasting for {product}: {str(e)}")
+        # Create a filename with date stamp
+        today = datetime.now().strftime('%Y%m%d')
+        filename = f"all_products_forecast_{today}.csv"
         
-        # Combine all product forecasts
-        if all_forecasts:
-            combined_df = pd.concat(all_forecasts)
-            
-            # Create a BytesIO object to store the CSV
-            csv_buffer = io.BytesIO()
-            combined_df.to_csv(csv_buffer, index=False, encoding='utf-8')
-            csv_buffer.seek(0)
-            
-            # Create a filename with date stamp
-            today = datetime.now().strftime('%Y%m%d')
-            filename = f"all_products_forecast_{today}.csv"
-            
-            return send_file(
-                csv_buffer,
-                mimetype='text/csv',
-                as_attachment=True,
-                download_name=filename
-            )
-        else:
-            return render_template("error.html", error_message="No forecasts could be generated")
+        return csv_download_response(generate(), filename)
+    except DatasetUnavailableError as e:
+        return render_template("error.html", error_message=str(e))
     except Exception as e:
         logger.error(f"Error generating CSV for all products: {str(e)}")
         return render_template("error.html", error_message=str(e))
@@ -520,34 +843,17 @@ def download_report(product, days):
     try:
         logger.info(f"Generating PDF report for {product} with {days} days horizon")
         
-        # Determine which dataset to use
-        dataset_source = "Default Dataset" 
-        if 'uploaded_dataset_id' in session:
-            cache_id = session['uploaded_dataset_id']
-            df = dataset_cache.get(cache_id)
-            if df is None:
-                return render_template("error.html", 
-                    error_message="Uploaded dataset no longer available. Please upload again.")
-            
-            # Verify product exists in the dataset
-            if product not in df['Product'].unique():
-                return render_template("error.html", 
-                    error_message=f"Selected product '{product}' not found in uploaded dataset")
-            
-            # Ensure Date is in datetime format
-            df['Date'] = pd.to_datetime(df['Date'], format='%d-%m-%Y')
-            dataset_source = "Uploaded Dataset"
-            
-            # Generate forecast
-            from forecast import forecast_demand
-            result = forecast_demand(product, days, data=df)
-        else:
-            # Use default dataset
-            from forecast import forecast_demand
-            result = forecast_demand(product, days)
+        # Verify product exists in the dataset
+        dataset = get_active_dataset()
+        if product not in dataset.products_set:
+            return render_template("error.html", 
+                error_message=f"Selected product '{product}' not found in {dataset.source.lower()}")
+        
+        # Generate forecast
+        result = get_cached_forecast(product, days, dataset.key, dataset.df)
         
         # Generate the PDF report
-        pdf_buffer = generate_pdf_report(product, days, result, dataset_source)
+        pdf_buffer = generate_pdf_report(product, days, result, dataset.source)
         
         # Create a filename with date stamp
         today = datetime.now().strftime('%Y%m%d')
@@ -561,6 +867,8 @@ def download_report(product, days):
         logger.info(f"PDF report for {product} generated successfully")
         return response
         
+    except DatasetUnavailableError as e:
+        return render_template("error.html", error_message=str(e))
     except Exception as e:
         logger.error(f"Error generating PDF report: {str(e)}")
         return render_template("error.html", error_message=f"Error generating PDF report: {str(e)}")
@@ -2,48 +2,174 @@
 
 import pandas as pd
 import numpy as np
-from statsmodels.tsa.statespace.sarimax import SARIMAX
-import plotly.graph_objects as go
 from datetime import datetime
+from statistics import NormalDist
 import logging
-import functools
+import hashlib
+import os
+import tempfile
+import threading
 import time
+from collections import OrderedDict
+
+# statsmodels and plotly take seconds to import, so they are loaded on first
+# use; routes that never forecast don't pay for them
+_SARIMAX = None
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Create LRU cache for forecasts to avoid redundant calculations
-@functools.lru_cache(maxsize=50)
-def cached_forecast(product, future_steps, data_key=None):
-    """Cached version of forecast_demand to improve performance for repeated queries."""
-    if data_key:
-        # If using custom data, we need to handle it differently
-        # as pandas DataFrame is not hashable for caching
-        if not isinstance(data_key, str):
-            return forecast_demand(product, future_steps, data=data_key)
-        
-        # Load data from cache or file based on the key
+# Target service level for safety stock, and its z-score (~1.645), computed once
+SERVICE_LEVEL = 0.95
+_Z_SCORE = NormalDist().inv_cdf(SERVICE_LEVEL)
+
+DEFAULT_DATA_CSV = "demand_inventory.csv"
+DEFAULT_DATA_PARQUET = "demand_inventory.parquet"
+
+def _load_default():
+    """
+    Load the default dataset, preferring a Parquet copy of the CSV.
+    
+    The Parquet file is written on first load (when pyarrow is available) and
+    rebuilt whenever the CSV is newer, so later imports skip CSV parsing. It
+    is written under a temporary name and renamed into place, so processes
+    importing concurrently never read a partial file.
+    """
+    try:
+        if os.path.getmtime(DEFAULT_DATA_PARQUET) >= os.path.getmtime(DEFAULT_DATA_CSV):
+            return pd.read_parquet(DEFAULT_DATA_PARQUET)
+    except (OSError, ImportError, ValueError):
+        pass
+    
+    data = pd.read_csv(DEFAULT_DATA_CSV, parse_dates=['Date'], date_format='%d-%m-%Y')
+    try:
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(DEFAULT_DATA_PARQUET)),
+                                         suffix='.tmp', delete=False) as tmp:
+            tmp_path = tmp.name
         try:
-            from pandas import read_csv
-            data = read_csv(data_key)
-            return forecast_demand(product, future_steps, data=data)
-        except Exception as e:
-            logger.error(f"Error in cached_forecast: {str(e)}")
-            raise e
-    else:
-        # Use default data
-        return forecast_demand(product, future_steps)
+            data.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, DEFAULT_DATA_PARQUET)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    except (OSError, ImportError) as e:
+        logger.debug(f"Not caching default dataset as Parquet: {str(e)}")
+    return data
 
-def forecast_demand(product, future_steps, data=None):
+# Default dataset, parsed once per process
+try:
+    _DEFAULT_DF = _load_default()
+except Exception as e:
+    logger.error(f"Error loading default dataset: {str(e)}")
+    _DEFAULT_DF = None
+
+def _index_by_product(data):
+    """
+    Split a dataset by product.
+    
+    Returns:
+        tuple: (date-sorted demand series per product, latest inventory per product)
+    """
+    groups = {}
+    last_inventory = {}
+    for product, group in data.sort_values('Date', kind='stable').groupby('Product', sort=False):
+        groups[product] = group.set_index('Date')['Demand']
+        last_inventory[product] = float(group['Inventory'].iloc[-1])
+    return groups, last_inventory
+
+# Default dataset pre-indexed by product: date-sorted demand series and the
+# latest inventory level, so default forecasts skip the full-table filter.
+# Built in a function, so the sorted copy of the table isn't kept alive
+_PRODUCT_GROUPS, _PRODUCT_LAST_INV = _index_by_product(_DEFAULT_DF) if _DEFAULT_DF is not None else ({}, {})
+
+# Sorted default product names, computed once for the app's product lists
+DEFAULT_PRODUCTS = tuple(sorted(_PRODUCT_GROUPS))
+
+def series_key(time_series):
+    """Returns a content hash of a time series (values and dates) for caching fits."""
+    hashed = pd.util.hash_pandas_object(time_series, index=True).values
+    return hashlib.blake2b(hashed.tobytes(), digest_size=16).hexdigest()
+
+# Fitted models are cached by series content so repeat forecasts, including
+# other horizons on the same data, skip the statsmodels optimizer entirely.
+# The key is the content hash and model orders; the series itself stays out
+# of it, so lookups don't hash or compare whole series
+_FIT_CACHE = OrderedDict()
+_MAX_CACHED_FITS = 64
+_FIT_CACHE_LOCK = threading.Lock()
+
+def _get_fit(data_key, values, order, seasonal_order):
+    """Returns the SARIMAX fit for the series values; data_key is their content hash."""
+    cache_key = (data_key, order, seasonal_order)
+    with _FIT_CACHE_LOCK:
+        model_fit = _FIT_CACHE.get(cache_key)
+        if model_fit is not None:
+            _FIT_CACHE.move_to_end(cache_key)
+            return model_fit
+    
+    model_fit = _fit_model(values, order, seasonal_order)
+    with _FIT_CACHE_LOCK:
+        _FIT_CACHE[cache_key] = model_fit
+        if len(_FIT_CACHE) > _MAX_CACHED_FITS:
+            _FIT_CACHE.popitem(last=False)
+    return model_fit
+
+def _fit_model(values, order, seasonal_order):
+    """Fits SARIMAX to the float64 array values."""
+    global _SARIMAX
+    if _SARIMAX is None:
+        from statsmodels.tsa.statespace.sarimax import SARIMAX as _SARIMAX
+    model = _SARIMAX(
+        values, 
+        order=order, 
+        seasonal_order=seasonal_order,
+        enforce_stationarity=False,  # Allow non-stationary behavior
+        enforce_invertibility=False   # Allow non-invertible behavior
+    )
+    
+    # These fits converge in well under 50 L-BFGS iterations
+    return model.fit(disp=False, method='lbfgs', maxiter=50)
+
+def _inventory_metrics(forecast_values, initial_inventory, z, lead_time, service_level,
+                       holding_cost, stockout_cost):
+    """
+    Compute inventory metrics from forecast values with plain NumPy arithmetic.
+    
+    Returns:
+        tuple: (order_quantity, reorder_point, safety_stock, total_cost)
+    """
+    mean_demand = forecast_values.mean()
+    # Sample standard deviation, matching pandas' Series.std()
+    forecast_std = forecast_values.std(ddof=1)
+    
+    # Economic Order Quantity calculation (simplified)
+    order_quantity = int(np.ceil(mean_demand * 2 + z * forecast_std))
+    reorder_point = mean_demand * lead_time + z * forecast_std * np.sqrt(lead_time)
+    safety_stock = reorder_point - mean_demand * lead_time
+    
+    # Cost calculations
+    total_holding_cost = holding_cost * (initial_inventory + 0.5 * order_quantity)
+    stockout_probability = 1 - service_level
+    expected_stockout = stockout_probability * mean_demand * lead_time
+    total_stockout_cost = stockout_cost * expected_stockout
+    total_cost = total_holding_cost + total_stockout_cost
+    
+    return order_quantity, reorder_point, safety_stock, total_cost
+
+def forecast_demand(product, future_steps, data=None, return_plot=True):
     """
     Generate demand forecasts for the specified product.
     
     Args:
         product (str): The product name to forecast
         future_steps (int): Number of days to forecast into the future
-        data (DataFrame, optional): Custom dataset to use instead of default
-        
+        data (DataFrame, optional): Custom dataset to use instead of default.
+            Its Date column must already be datetime64 (validated uploads are
+            cached that way), so no date re-parsing happens here.
+        return_plot (bool): Whether to build the Plotly figure; when False,
+            plot_json is None
+
     Returns:
         dict: Dictionary containing forecast results and metrics
     """
@@ -51,21 +177,23 @@ def forecast_demand(product, future_steps, data=None):
     logger.info(f"Starting forecast for {product} with {future_steps} days horizon")
     
     if data is None:
-        try:
-            from pandas import read_csv
-            data = read_csv("demand_inventory.csv")
-            data['Date'] = pd.to_datetime(data['Date'], format='%d-%m-%Y')
-        except Exception as e:
-            logger.error(f"Error loading default dataset: {str(e)}")
-            raise e
-    
-    # Filter and prepare data for the selected product
-    product_data = data[data['Product'] == product].copy()
-    if len(product_data) == 0:
-        raise ValueError(f"No data found for product: {product}")
-    
-    product_data = product_data.sort_values('Date')
-    time_series = product_data.set_index('Date')['Demand']
+        if _DEFAULT_DF is None:
+            raise ValueError("Default dataset is not available")
+        if product not in _PRODUCT_GROUPS:
+            raise ValueError(f"No data found for product: {product}")
+        time_series = _PRODUCT_GROUPS[product]
+        initial_inventory = _PRODUCT_LAST_INV[product]
+    else:
+        # Filter and prepare data for the selected product; it is only read, so no copy
+        product_data = data[data['Product'] == product]
+        if len(product_data) == 0:
+            raise ValueError(f"No data found for product: {product}")
+        
+        # Uploads are usually already chronological; only sort when they aren't
+        if not product_data['Date'].is_monotonic_increasing:
+            product_data = product_data.sort_values('Date', kind='stable')
+        time_series = product_data.set_index('Date')['Demand']
+        initial_inventory = float(product_data['Inventory'].iloc[-1])
     
     # Check if we have enough data points
     if len(time_series) < 10:
@@ -76,23 +204,15 @@ def forecast_demand(product, future_steps, data=None):
     order = (1, 1, 1)
     seasonal_order = (1, 1, 1, 7)  # Assuming weekly seasonality
     
-    # Fit SARIMAX model with progress logging
+    # Fit SARIMAX model (or reuse the cached fit for identical data)
+    data_key = series_key(time_series)
     logger.info(f"Fitting SARIMAX model for {product}")
     try:
-        model = SARIMAX(
-            time_series, 
-            order=order, 
-            seasonal_order=seasonal_order,
-            enforce_stationarity=False,  # Allow non-stationary behavior
-            enforce_invertibility=False   # Allow non-invertible behavior
-        )
-        model_fit = model.fit(disp=False, maxiter=200)
+        model_fit = _get_fit(data_key, time_series.to_numpy(dtype=np.float64), order, seasonal_order)
         
         # Forecast future demand
-        predictions = model_fit.predict(
-            start=len(time_series), 
-            end=len(time_series) + future_steps - 1
-        ).astype(int)
+        forecast = model_fit.get_forecast(future_steps)
+        predictions = forecast.predicted_mean.astype(int)
         
         # Ensure predictions are non-negative
         predictions = np.maximum(predictions, 0)
@@ -102,113 +222,104 @@ def forecast_demand(product, future_steps, data=None):
             periods=future_steps, 
             freq='D'
         )
-        forecasted_demand = pd.Series(predictions, index=future_dates)
         
         # Inventory calculations with improved metrics
         lead_time = 1  # Default lead time (days)
-        service_level = 0.95  # 95% service level
+        service_level = SERVICE_LEVEL  # 95% service level
         holding_cost = 0.1  # Cost of holding inventory
         stockout_cost = 10  # Cost of stockout
         
-        initial_inventory = product_data['Inventory'].iloc[-1]
-        
         # Calculate safety stock based on forecast variability
-        forecast_std = forecasted_demand.std()
-        z = np.abs(np.percentile(np.random.normal(0, 1, 10000), 100 * service_level))
-        
-        # Economic Order Quantity calculation (simplified)
-        order_quantity = np.ceil(forecasted_demand.mean() * 2 + z * forecast_std).astype(int)
-        reorder_point = forecasted_demand.mean() * lead_time + z * forecast_std * np.sqrt(lead_time)
-        safety_stock = reorder_point - forecasted_demand.mean() * lead_time
-        
-        # Cost calculations
-        total_holding_cost = holding_cost * (initial_inventory + 0.5 * order_quantity)
-        stockout_probability = 1 - service_level
-        expected_stockout = stockout_probability * forecasted_demand.mean() * lead_time
-        total_stockout_cost = stockout_cost * expected_stockout
-        total_cost = total_holding_cost + total_stockout_cost
-        
-        # Create interactive Plotly figure with improved visualization
-        fig = go.Figure()
-        
-        # Add historical data
-        fig.add_trace(go.Scatter(
-            x=time_series.index,
-            y=time_series.values,
-            name='Historical Demand',
-            line=dict(color='blue', width=2),
-            mode='lines+markers'
-        ))
-        
-        # Add forecast data
-        fig.add_trace(go.Scatter(
-            x=future_dates,
-            y=predictions,
-            name='Forecast',
-            line=dict(color='orange', width=2, dash='dot'),
-            mode='lines+markers'
-        ))
-        
-        # Add confidence intervals
-        forecast_std = max(forecast_std, 5)  # Minimum std to make interval visible
-        
-        upper_bound = predictions + 1.96 * forecast_std
-        lower_bound = np.maximum(predictions - 1.96 * forecast_std, 0)  # Ensure non-negative
-        
-        fig.add_trace(go.Scatter(
-            x=future_dates,
-            y=upper_bound,
-            fill=None,
-            mode='lines',
-            line=dict(width=0),
-            showlegend=False
-        ))
-        
-        fig.add_trace(go.Scatter(
-            x=future_dates,
-            y=lower_bound,
-            fill='tonexty',
-            mode='lines',
-            line=dict(width=0),
-            fillcolor='rgba(255,165,0,0.2)',
-            name='95% Confidence Interval'
-        ))
-        
-        # Show reorder point as a horizontal line
-        fig.add_trace(go.Scatter(
-            x=[time_series.index[0], future_dates[-1]],
-            y=[reorder_point, reorder_point],
-            mode='lines',
-            line=dict(color='red', width=1, dash='dash'),
-            name='Reorder Point'
-        ))
-        
-        # Update layout for better visualization
-        fig.update_layout(
-            title=f'Demand Forecast for {product}',
-            xaxis_title='Date',
-            yaxis_title='Demand',
-            hovermode='x unified',
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1
-            ),
-            margin=dict(l=20, r=20, t=60, b=20),
-            plot_bgcolor='white'
+        order_quantity, reorder_point, safety_stock, total_cost = _inventory_metrics(
+            np.asarray(predictions, dtype=np.float64), initial_inventory, _Z_SCORE,
+            lead_time, service_level, holding_cost, stockout_cost
         )
         
-        # Convert figure to JSON for frontend rendering
-        plot_json = fig.to_json()
+        # The Plotly figure is only built for callers that use plot_json
+        plot_json = None
+        if return_plot:
+            import plotly.graph_objects as go
+            
+            # Create interactive Plotly figure with improved visualization
+            fig = go.Figure()
+            
+            # Add historical data
+            fig.add_trace(go.Scatter(
+                x=time_series.index,
+                y=time_series.values,
+                name='Historical Demand',
+                line=dict(color='blue', width=2),
+                mode='lines+markers'
+            ))
+            
+            # Add forecast data
+            fig.add_trace(go.Scatter(
+                x=future_dates,
+                y=predictions,
+                name='Forecast',
+                line=dict(color='orange', width=2, dash='dot'),
+                mode='lines+markers'
+            ))
+            
+            # Add the model's 95% confidence intervals
+            conf_int = forecast.conf_int(alpha=0.05)
+            lower_bound = np.maximum(conf_int[:, 0], 0)  # Ensure non-negative
+            upper_bound = conf_int[:, 1]
+            
+            fig.add_trace(go.Scatter(
+                x=future_dates,
+                y=upper_bound,
+                fill=None,
+                mode='lines',
+                line=dict(width=0),
+                showlegend=False
+            ))
+            
+            fig.add_trace(go.Scatter(
+                x=future_dates,
+                y=lower_bound,
+                fill='tonexty',
+                mode='lines',
+                line=dict(width=0),
+                fillcolor='rgba(255,165,0,0.2)',
+                name='95% Confidence Interval'
+            ))
+            
+            # Show reorder point as a horizontal line
+            fig.add_trace(go.Scatter(
+                x=[time_series.index[0], future_dates[-1]],
+                y=[reorder_point, reorder_point],
+                mode='lines',
+                line=dict(color='red', width=1, dash='dash'),
+                name='Reorder Point'
+            ))
+            
+            # Update layout for better visualization
+            fig.update_layout(
+                title=f'Demand Forecast for {product}',
+                xaxis_title='Date',
+                yaxis_title='Demand',
+                hovermode='x unified',
+                legend=dict(
+                    orientation="h",
+                    yanchor="bottom",
+                    y=1.02,
+                    xanchor="right",
+                    x=1
+                ),
+                margin=dict(l=20, r=20, t=60, b=20),
+                plot_bgcolor='white'
+            )
+            
+            # Convert figure to JSON for frontend rendering
+            plot_json = fig.to_json()
         
         end_time = time.time()
         logger.info(f"Forecast for {product} completed in {end_time - start_time:.2f} seconds")
         
         # Format dates for output
-        historical_dates = [d.strftime('%Y-%m-%d') for d in time_series.index.tolist()]
-        forecast_dates = [d.strftime('%Y-%m-%d') for d in future_dates.tolist()]
+        historical_dates = time_series.index.strftime('%Y-%m-%d').tolist()
+        forecast_dates = future_dates.strftime('%Y-%m-%d').tolist()
         
         return {
             "order_quantity": int(order_quantity),
@@ -218,6 +329,7 @@ def forecast_demand(product, future_steps, data=None):
             "plot_json": plot_json,
             "forecast_dates": forecast_dates,
             "forecast_values": predictions.tolist(),
+            "forecast_sum": int(predictions.sum()),
             "historical_dates": historical_dates,
             "historical_values": time_series.values.tolist()
         }
@@ -1,12 +1,14 @@
-import os
 import base64
-import tempfile
+import functools
+import importlib.util
 import logging
+import os
+import tempfile
 from datetime import datetime
 from io import BytesIO
-import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
+# ReportLab stays at module scope: xhtml2pdf imports it anyway, and the
+# Platypus styles below are built from it once
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -14,14 +16,127 @@ from reportlab.lib.units import inch, cm
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
 from reportlab.platypus.flowables import HRFlowable
 from xhtml2pdf import pisa
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from utils import ensure_private_dir
+
+# matplotlib and Plotly are only needed for the Platypus chart, so they are
+# imported on first use; the default HTML report never loads them
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Configure Jinja2 environment
-env = Environment(loader=FileSystemLoader('templates'))
+# Compiled template bytecode is shared on disk, so only the first worker
+# process compiles report_template.html. Cached bytecode is executed when
+# loaded, so the directory must be private to this user: by default Jinja's
+# own per-user directory, which it creates 0700 and checks; an override for
+# containers gets the same checks here
+JINJA_CACHE_DIR = os.environ.get("JINJA_CACHE_DIR")
+
+def _private_bytecode_cache(directory):
+    """Returns a bytecode cache in directory, refusing one other users can access."""
+    if directory is None:
+        return FileSystemBytecodeCache()
+    ensure_private_dir(directory)
+    return FileSystemBytecodeCache(directory)
+
+try:
+    _bytecode_cache = _private_bytecode_cache(JINJA_CACHE_DIR)
+except (OSError, RuntimeError) as e:
+    logger.warning(f"Jinja bytecode cache disabled: {str(e)}")
+    _bytecode_cache = None
+
+# Templates are found next to this module, whatever the working directory
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+# Configure Jinja2 environment; templates never change while the app runs,
+# so keep every compiled template and skip the per-render file stat
+env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), cache_size=-1, auto_reload=False,
+                  bytecode_cache=_bytecode_cache)
+_REPORT_TEMPLATE = env.get_template('report_template.html')
+
+# Platypus styles are read-only configuration, so they are built once and shared by every report
+_STYLES = getSampleStyleSheet()
+_TITLE_STYLE = _STYLES['Title']
+_HEADING_STYLE = _STYLES['Heading1']
+_SUBHEADING_STYLE = _STYLES['Heading2']
+_NORMAL_STYLE = _STYLES['Normal']
+_INFO_STYLE = ParagraphStyle(
+    'InfoStyle',
+    parent=_STYLES['Normal'],
+    fontSize=9,
+    textColor=colors.gray,
+    spaceAfter=12
+)
+
+# Header row and grid formatting shared by the report tables
+_TABLE_HEADER_COMMANDS = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+]
+_METRICS_TABLE_STYLE = TableStyle(_TABLE_HEADER_COMMANDS + [
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('ALIGN', (1, 1), (1, -1), 'CENTER'),
+])
+_FORECAST_TABLE_STYLE = TableStyle(_TABLE_HEADER_COMMANDS + [
+    ('ALIGN', (1, 1), (1, -1), 'CENTER'),
+])
+
+# Report text filled from the forecast results with format_map
+_RECOMMENDATIONS_TEMPLATE = """
+Based on the forecast analysis, we recommend the following actions:
+<br/><br/>
+1. <b>Inventory Management:</b> Maintain a safety stock of {safety_stock:.2f} units to prevent stockouts.
+<br/><br/>
+2. <b>Order Planning:</b> Place orders of {order_quantity} units when inventory reaches the reorder point of {reorder_point:.2f} units.
+<br/><br/>
+3. <b>Cost Optimization:</b> The estimated total cost for this inventory strategy is ${total_cost:.2f}, which balances holding costs and stockout risks.
+"""
+
+_NOTES_TEXT = """
+This forecast is based on the following assumptions:
+<br/><br/>
+• Historical demand patterns will continue to be relevant for future demand.
+<br/>
+• The lead time for replenishment is constant.
+<br/>
+• A service level of 95% is targeted (5% acceptable stockout risk).
+<br/>
+• The forecast does not account for unexpected market disruptions or special events.
+<br/><br/>
+For best results, the forecast should be regularly updated as new data becomes available.
+"""
+
+# Forecasts longer than this are reported through Platypus, which pages
+# through every row, instead of the HTML report and its truncated tables
+HTML_REPORT_MAX_DAYS = 50
+
+@functools.lru_cache(maxsize=None)
+def platypus_chart_available():
+    """Whether matplotlib is installed to draw the Platypus chart without Kaleido."""
+    return importlib.util.find_spec("matplotlib") is not None
+
+# Reports for the same dataset and horizon share their date lists, so the
+# parsed forms are cached by the tuple of ISO date strings. pandas is only
+# imported here, on the first uncached call, so loading this module doesn't
+# pay for it
+@functools.lru_cache(maxsize=32)
+def _parse_report_dates(dates):
+    """Parses a tuple of YYYY-MM-DD strings into a tuple of datetimes."""
+    import pandas as pd
+    return tuple(pd.to_datetime(list(dates), format='%Y-%m-%d').to_pydatetime())
+
+@functools.lru_cache(maxsize=32)
+def _format_report_dates(dates):
+    """Formats a tuple of YYYY-MM-DD strings for display, e.g. 'Jan 05, 2024'."""
+    import pandas as pd
+    return tuple(pd.to_datetime(list(dates), format='%Y-%m-%d').strftime('%b %d, %Y'))
 
 def create_forecast_report_platypus(product, days, forecast_results, dataset_source="Default Dataset"):
     """
@@ -53,50 +168,33 @@ def create_forecast_report_platypus(product, days, forecast_results, dataset_sou
             title=f"Demand Forecast Report - {product}"
         )
         
-        # Get styles
-        styles = getSampleStyleSheet()
-        title_style = styles['Title']
-        heading_style = styles['Heading1']
-        subheading_style = styles['Heading2']
-        normal_style = styles['Normal']
-        
-        # Create custom styles
-        info_style = ParagraphStyle(
-            'InfoStyle',
-            parent=styles['Normal'],
-            fontSize=9,
-            textColor=colors.gray,
-            spaceAfter=12
-        )
-        
-        table_title_style = ParagraphStyle(
-            'TableTitle',
-            parent=styles['Heading3'],
-            fontSize=12,
-            spaceAfter=6
-        )
-        
-        # Store elements for the PDF
-        elements = []
-        
-        # Add title
-        elements.append(Paragraph(f"Demand Forecast Report", title_style))
-        elements.append(Spacer(1, 0.25*inch))
+        # Shared module-level styles
+        title_style = _TITLE_STYLE
+        heading_style = _HEADING_STYLE
+        subheading_style = _SUBHEADING_STYLE
+        normal_style = _NORMAL_STYLE
+        info_style = _INFO_STYLE
         
-        # Add report metadata
+        # Store elements for the PDF; each section is added with a single extend
         current_date = datetime.now().strftime("%Y-%m-%d %H:%M")
-        elements.append(Paragraph(f"Product: <b>{product}</b>", normal_style))
-        elements.append(Paragraph(f"Forecast Period: {days} days", normal_style))
-        elements.append(Paragraph(f"Report Generated: {current_date}", normal_style))
-        elements.append(Paragraph(f"Data Source: {dataset_source}", normal_style))
-        elements.append(HRFlowable(width="100%", thickness=1, lineCap='round', color=colors.gray, spaceBefore=10, spaceAfter=10))
-        
-        # Add executive summary
-        elements.append(Paragraph("Executive Summary", heading_style))
+        elements = [
+            # Title
+            Paragraph(f"Demand Forecast Report", title_style),
+            Spacer(1, 0.25*inch),
+            # Report metadata
+            Paragraph(f"Product: <b>{product}</b>", normal_style),
+            Paragraph(f"Forecast Period: {days} days", normal_style),
+            Paragraph(f"Report Generated: {current_date}", normal_style),
+            Paragraph(f"Data Source: {dataset_source}", normal_style),
+            HRFlowable(width="100%", thickness=1, lineCap='round', color=colors.gray, spaceBefore=10, spaceAfter=10),
+            # Executive summary
+            Paragraph("Executive Summary", heading_style),
+        ]
         
-        # Calculate summary metrics
-        avg_forecast = np.mean(forecast_results["forecast_values"])
-        forecast_trend = forecast_results["forecast_values"][-1] - forecast_results["forecast_values"][0]
+        # Calculate summary metrics from one float array
+        fv = np.asarray(forecast_results["forecast_values"], dtype=np.float64)
+        avg_forecast = fv.mean()
+        forecast_trend = fv[-1] - fv[0]
         trend_direction = "upward" if forecast_trend > 0 else "downward" if forecast_trend < 0 else "stable"
         
         summary_text = f"""
@@ -105,12 +203,8 @@ def create_forecast_report_platypus(product, days, forecast_results, dataset_sou
         of <b>{forecast_results["order_quantity"]} units</b> is recommended with a reorder point of 
         <b>{forecast_results["reorder_point"]:.2f} units</b>.
         """
-        elements.append(Paragraph(summary_text, normal_style))
-        elements.append(Spacer(1, 0.2*inch))
-        
-        # Add key metrics as a table
-        elements.append(Paragraph("Key Metrics", subheading_style))
         
+        # Key metrics table
         metrics_data = [
             ["Metric", "Value", "Description"],
             ["Order Quantity", f"{forecast_results['order_quantity']} units", "Recommended order size for optimal inventory"],
@@ -120,176 +214,129 @@ def create_forecast_report_platypus(product, days, forecast_results, dataset_sou
         ]
         
         metrics_table = Table(metrics_data, colWidths=[2*inch, 1.5*inch, 3*inch])
-        metrics_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('ALIGN', (1, 1), (1, -1), 'CENTER'),
-        ]))
-        elements.append(metrics_table)
-        elements.append(Spacer(1, 0.3*inch))
-        
-        # Generate forecast visualization
-        elements.append(Paragraph("Demand Forecast Visualization", subheading_style))
-        
-        # Create a Plotly figure for the forecast
-        fig = go.Figure()
-        
-        # Add historical data
-        historical_dates = [datetime.strptime(d, '%Y-%m-%d') for d in forecast_results["historical_dates"]]
-        fig.add_trace(go.Scatter(
-            x=historical_dates,
-            y=forecast_results["historical_values"],
-            name='Historical Demand',
-            line=dict(color='blue', width=2),
-            mode='lines+markers'
-        ))
-        
-        # Add forecast data
-        forecast_dates = [datetime.strptime(d, '%Y-%m-%d') for d in forecast_results["forecast_dates"]]
-        fig.add_trace(go.Scatter(
-            x=forecast_dates,
-            y=forecast_results["forecast_values"],
-            name='Forecast',
-            line=dict(color='orange', width=2, dash='dot'),
-            mode='lines+markers'
-        ))
-        
-        # Add reorder point line
-        all_dates = historical_dates + forecast_dates
-        fig.add_trace(go.Scatter(
-            x=[all_dates[0], all_dates[-1]],
-            y=[forecast_results["reorder_point"], forecast_results["reorder_point"]],
-            name='Reorder Point',
-            line=dict(color='red', width=1, dash='dash'),
+        metrics_table.setStyle(_METRICS_TABLE_STYLE)
+        elements.extend((
+            Paragraph(summary_text, normal_style),
+            Spacer(1, 0.2*inch),
+            # Key metrics as a table
+            Paragraph("Key Metrics", subheading_style),
+            metrics_table,
+            Spacer(1, 0.3*inch),
+            # Forecast visualization
+            Paragraph("Demand Forecast Visualization", subheading_style),
         ))
         
-        # Update layout
-        fig.update_layout(
-            title=f'Demand Forecast for {product}',
-            xaxis_title='Date',
-            yaxis_title='Demand (Units)',
-            legend=dict(orientation="h", y=1.1),
-            width=500,
-            height=400,
-            margin=dict(l=40, r=20, t=60, b=40),
-        )
+        historical_dates = _parse_report_dates(tuple(forecast_results["historical_dates"]))
+        forecast_dates = _parse_report_dates(tuple(forecast_results["forecast_dates"]))
         
-        # Save the figure to a temporary file
-        img_path = tempfile.NamedTemporaryFile(suffix='.png', delete=False).name
-        fig.write_image(img_path)
-        
-        # Add the image to the PDF
-        elements.append(Image(img_path, width=450, height=300))
-        elements.append(Spacer(1, 0.2*inch))
-        
-        elements.append(Paragraph("Forecast Data Table", subheading_style))
-        elements.append(Paragraph("The following table shows the forecasted demand values for the next " + str(days) + " days:", normal_style))
-        
-        # Create a table for forecast data
-        forecast_table_data = [["Date", "Forecasted Demand"]]
-        for date, value in zip(forecast_results["forecast_dates"], forecast_results["forecast_values"]):
-            forecast_table_data.append([date, f"{value:.2f}"])
-        
-        # Split the data into chunks if too large
-        max_rows_per_table = 15
-        if len(forecast_table_data) > max_rows_per_table + 1:
-            current_row = 1
-            while current_row < len(forecast_table_data):
-                end_row = min(current_row + max_rows_per_table, len(forecast_table_data))
-                chunk = [forecast_table_data[0]] + forecast_table_data[current_row:end_row]
-                
-                forecast_data_table = Table(chunk, colWidths=[2.5*inch, 2*inch])
-                forecast_data_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                    ('ALIGN', (1, 1), (1, -1), 'CENTER'),
-                ]))
-                elements.append(forecast_data_table)
-                elements.append(Spacer(1, 0.2*inch))
-                
-                if end_row < len(forecast_table_data):
-                    elements.append(PageBreak())
-                    elements.append(Paragraph("Forecast Data Table (continued)", subheading_style))
-                
-                current_row = end_row
+        try:
+            from matplotlib.figure import Figure
+        except ImportError:  # matplotlib is optional; charts fall back to Plotly + Kaleido
+            Figure = None
+        
+        # The PNG is rendered into memory and read from there by ReportLab
+        img_buffer = BytesIO()
+        if Figure is not None:
+            # Matplotlib's Agg canvas renders in-process, in milliseconds
+            fig = Figure(figsize=(5, 4), dpi=100)
+            ax = fig.add_subplot()
+            ax.plot(historical_dates, forecast_results["historical_values"], '-o',
+                    color='blue', linewidth=2, markersize=3, label='Historical Demand')
+            ax.plot(forecast_dates, forecast_results["forecast_values"], ':o',
+                    color='orange', linewidth=2, markersize=3, label='Forecast')
+            ax.hlines(forecast_results["reorder_point"], historical_dates[0], forecast_dates[-1],
+                      colors='red', linewidth=1, linestyles='dashed', label='Reorder Point')
+            ax.set_title(f'Demand Forecast for {product}')
+            ax.set_xlabel('Date')
+            ax.set_ylabel('Demand (Units)')
+            ax.legend(loc='lower center', bbox_to_anchor=(0.5, 1.08), ncol=3, fontsize='small', frameon=False)
+            fig.autofmt_xdate()
+            fig.tight_layout()
+            fig.savefig(img_buffer, format='png')
         else:
-            forecast_data_table = Table(forecast_table_data, colWidths=[2.5*inch, 2*inch])
-            forecast_data_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                ('ALIGN', (1, 1), (1, -1), 'CENTER'),
-            ]))
-            elements.append(forecast_data_table)
-        
-        elements.append(Spacer(1, 0.3*inch))
-        
-        # Recommendations section
-        elements.append(PageBreak())
-        elements.append(Paragraph("Recommendations", heading_style))
-        
-        recommendations_text = f"""
-        Based on the forecast analysis, we recommend the following actions:
-        <br/><br/>
-        1. <b>Inventory Management:</b> Maintain a safety stock of {forecast_results["safety_stock"]:.2f} units to prevent stockouts.
-        <br/><br/>
-        2. <b>Order Planning:</b> Place orders of {forecast_results["order_quantity"]} units when inventory reaches the reorder point of {forecast_results["reorder_point"]:.2f} units.
-        <br/><br/>
-        3. <b>Cost Optimization:</b> The estimated total cost for this inventory strategy is ${forecast_results["total_cost"]:.2f}, which balances holding costs and stockout risks.
-        """
-        elements.append(Paragraph(recommendations_text, normal_style))
-        
-        # Notes and assumptions
-        elements.append(Spacer(1, 0.3*inch))
-        elements.append(Paragraph("Notes and Assumptions", subheading_style))
-        
-        notes_text = """
-        This forecast is based on the following assumptions:
-        <br/><br/>
-        • Historical demand patterns will continue to be relevant for future demand.
-        <br/>
-        • The lead time for replenishment is constant.
-        <br/>
-        • A service level of 95% is targeted (5% acceptable stockout risk).
-        <br/>
-        • The forecast does not account for unexpected market disruptions or special events.
-        <br/><br/>
-        For best results, the forecast should be regularly updated as new data becomes available.
-        """
-        elements.append(Paragraph(notes_text, normal_style))
+            # Without matplotlib, fall back to Plotly's Kaleido export
+            import plotly.graph_objects as go
+            
+            fig = go.Figure()
+            
+            # Add historical data
+            fig.add_trace(go.Scatter(
+                x=historical_dates,
+                y=forecast_results["historical_values"],
+                name='Historical Demand',
+                line=dict(color='blue', width=2),
+                mode='lines+markers'
+            ))
+            
+            # Add forecast data
+            fig.add_trace(go.Scatter(
+                x=forecast_dates,
+                y=forecast_results["forecast_values"],
+                name='Forecast',
+                line=dict(color='orange', width=2, dash='dot'),
+                mode='lines+markers'
+            ))
+            
+            # Add reorder point line
+            fig.add_trace(go.Scatter(
+                x=[historical_dates[0], forecast_dates[-1]],
+                y=[forecast_results["reorder_point"], forecast_results["reorder_point"]],
+                name='Reorder Point',
+                line=dict(color='red', width=1, dash='dash'),
+            ))
+            
+            # Update layout
+            fig.update_layout(
+                title=f'Demand Forecast for {product}',
+                xaxis_title='Date',
+                yaxis_title='Demand (Units)',
+                legend=dict(orientation="h", y=1.1),
+                width=500,
+                height=400,
+                margin=dict(l=40, r=20, t=60, b=40),
+            )
+            
+            fig.write_image(img_buffer, format='png')
+        
+        img_buffer.seek(0)
+        
+        # Create a table for forecast data; the values are formatted in one NumPy call
+        forecast_table_data = [["Date", "Forecasted Demand"]] + [
+            [date, value]
+            for date, value in zip(forecast_results["forecast_dates"], np.char.mod('%.2f', fv).tolist())
+        ]
         
-        # Footer with report generation info
-        elements.append(Spacer(1, 0.5*inch))
-        elements.append(HRFlowable(width="100%", thickness=1, lineCap='round', color=colors.gray, spaceBefore=10, spaceAfter=10))
-        elements.append(Paragraph(f"Report generated by Smart Demand Forecast on {current_date}", info_style))
+        # One table; Platypus splits it across pages and repeats the header row
+        forecast_data_table = Table(forecast_table_data, colWidths=[2.5*inch, 2*inch], repeatRows=1)
+        forecast_data_table.setStyle(_FORECAST_TABLE_STYLE)
+        
+        recommendations_text = _RECOMMENDATIONS_TEMPLATE.format_map(forecast_results)
+        elements.extend((
+            # The chart image
+            Image(img_buffer, width=450, height=300),
+            Spacer(1, 0.2*inch),
+            # Forecast data table
+            Paragraph("Forecast Data Table", subheading_style),
+            Paragraph("The following table shows the forecasted demand values for the next " + str(days) + " days:", normal_style),
+            forecast_data_table,
+            Spacer(1, 0.3*inch),
+            # Recommendations section
+            PageBreak(),
+            Paragraph("Recommendations", heading_style),
+            Paragraph(recommendations_text, normal_style),
+            # Notes and assumptions
+            Spacer(1, 0.3*inch),
+            Paragraph("Notes and Assumptions", subheading_style),
+            Paragraph(_NOTES_TEXT, normal_style),
+            # Footer with report generation info
+            Spacer(1, 0.5*inch),
+            HRFlowable(width="100%", thickness=1, lineCap='round', color=colors.gray, spaceBefore=10, spaceAfter=10),
+            Paragraph(f"Report generated by Smart Demand Forecast on {current_date}", info_style),
+        ))
         
         # Build the PDF
         doc.build(elements)
         
-        # Clean up the temporary image file
-        try:
-            os.unlink(img_path)
-        except Exception as e:
-            logger.warning(f"Error removing temporary image: {str(e)}")
-        
         # Reset buffer position to the beginning
         buffer.seek(0)
         logger.info(f"PDF report for {product} generated successfully")
@@ -299,7 +346,7 @@ def create_forecast_report_platypus(product, days, forecast_results, dataset_sou
         logger.error(f"Error generating PDF report: {str(e)}")
         raise e
 
-def generate_html_report(product, days, forecast_results, dataset_source="Default Dataset"):
+def generate_html_report(product, days, forecast_results, dataset_source="Default Dataset", stream=False):
     """
     Generate an HTML report that can be converted to PDF with xhtml2pdf
     
@@ -308,9 +355,11 @@ def generate_html_report(product, days, forecast_results, dataset_source="Defaul
         days (int): Number of forecast days
         forecast_results (dict): Dictionary with forecast data and metrics
         dataset_source (str): Source of the dataset used
+        stream (bool): Whether to return the rendered HTML as an iterator of
+            chunks instead of one string
         
     Returns:
-        str: HTML content for the report
+        str or iterator: HTML content for the report
     """
     try:
         logger.info(f"Generating HTML report for {product}")
@@ -318,14 +367,14 @@ def generate_html_report(product, days, forecast_results, dataset_source="Defaul
         # Instead of using a Plotly image, create an HTML table representation of the data
         # This avoids the need for kaleido or other image export libraries
         
-        # Convert dates to proper format for display
-        historical_dates = [datetime.strptime(d, '%Y-%m-%d').strftime('%b %d, %Y') for d in forecast_results["historical_dates"][-7:]]  # Show last 7 days of historical data
-        forecast_dates = [datetime.strptime(d, '%Y-%m-%d').strftime('%b %d, %Y') for d in forecast_results["forecast_dates"]]
+        # Convert dates to proper format for display, parsing and formatting each list in one vectorized pass
+        historical_dates = _format_report_dates(tuple(forecast_results["historical_dates"][-7:]))  # Show last 7 days of historical data
+        forecast_dates = _format_report_dates(tuple(forecast_results["forecast_dates"]))
         
-        # Create HTML for the chart visualization
-        chart_html = """
+        # Create HTML for the chart visualization; rows are collected and joined once
+        parts = [f"""
         <div style="margin: 20px auto; max-width: 800px;">
-            <h3 style="text-align: center;">Demand Forecast Visualization for {}</h3>
+            <h3 style="text-align: center;">Demand Forecast Visualization for {product}</h3>
             <div style="display: flex; margin-bottom: 10px;">
                 <div style="width: 50%; text-align: center;">
                     <div style="display: inline-block; width: 12px; height: 12px; background-color: #2c3e50; margin-right: 5px;"></div>
@@ -343,12 +392,17 @@ def generate_html_report(product, days, forecast_results, dataset_source="Defaul
                     <th style="padding: 8px; text-align: right; border: 1px solid #ddd;">Demand</th>
                     <th style="padding: 8px; text-align: center; border: 1px solid #ddd;">Visual Indicator</th>
                 </tr>
-        """.format(product)
+        """]
+        
+        # Summary metrics and bar widths come from float arrays, scaled for all rows at once
+        fv = np.asarray(forecast_results["forecast_values"], dtype=np.float64)
+        hist_values = np.asarray(forecast_results["historical_values"][-7:], dtype=np.float64)
+        hist_bars = np.minimum((hist_values / 2).astype(int), 100).tolist()
+        display_days = min(14, len(forecast_dates))
+        forecast_bars = np.minimum((fv[:display_days] / 2).astype(int), 100).tolist()
         
         # Add historical data rows
-        for i, (date, value) in enumerate(zip(historical_dates, forecast_results["historical_values"][-7:])):
-            bar_width = min(int(value / 2), 100)  # Scale the bar width
-            chart_html += f"""
+        parts.extend(f"""
                 <tr>
                     <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">Historical</td>
                     <td style="padding: 8px; text-align: center; border: 1px solid #ddd;">{date}</td>
@@ -357,22 +411,19 @@ def generate_html_report(product, days, forecast_results, dataset_source="Defaul
                         <div style="background-color: #2c3e50; height: 15px; width: {bar_width}%;"></div>
                     </td>
                 </tr>
-            """
+            """ for date, value, bar_width in zip(historical_dates, hist_values.tolist(), hist_bars))
         
         # Add a separator row
-        chart_html += """
+        parts.append("""
             <tr>
                 <td colspan="4" style="padding: 4px; background-color: #f8f9fa; text-align: center; border: 1px solid #ddd; font-style: italic;">
                     Forecast begins
                 </td>
             </tr>
-        """
+        """)
         
         # Add forecast data rows (limit to first 14 days for readability)
-        display_days = min(14, len(forecast_dates))
-        for i, (date, value) in enumerate(zip(forecast_dates[:display_days], forecast_results["forecast_values"][:display_days])):
-            bar_width = min(int(value / 2), 100)  # Scale the bar width
-            chart_html += f"""
+        parts.extend(f"""
                 <tr>
                     <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">Forecast</td>
                     <td style="padding: 8px; text-align: center; border: 1px solid #ddd;">{date}</td>
@@ -381,23 +432,24 @@ def generate_html_report(product, days, forecast_results, dataset_source="Defaul
                         <div style="background-color: #e74c3c; height: 15px; width: {bar_width}%;"></div>
                     </td>
                 </tr>
-            """
+            """ for date, value, bar_width in zip(forecast_dates, fv[:display_days].tolist(), forecast_bars))
         
         # Add note if forecast is truncated
         if display_days < len(forecast_dates):
-            chart_html += f"""
+            parts.append(f"""
                 <tr>
                     <td colspan="4" style="padding: 4px; background-color: #f8f9fa; text-align: center; border: 1px solid #ddd; font-style: italic;">
                         {len(forecast_dates) - display_days} more days of forecast data not shown in this visualization
                     </td>
                 </tr>
-            """
+            """)
         
         # Close the table
-        chart_html += """
+        parts.append("""
             </table>
         </div>
-        """
+        """)
+        chart_html = "".join(parts)
         
         # Use the HTML table as our chart image
         img_src = ""  # No image needed
@@ -407,41 +459,36 @@ def generate_html_report(product, days, forecast_results, dataset_source="Defaul
         current_date = datetime.now().strftime("%Y-%m-%d %H:%M")
         
         # Calculate summary metrics
-        avg_forecast = np.mean(forecast_results["forecast_values"])
-        total_forecast = sum(forecast_results["forecast_values"])
-        forecast_trend = forecast_results["forecast_values"][-1] - forecast_results["forecast_values"][0]
+        avg_forecast = fv.mean()
+        total_forecast = fv.sum()
+        forecast_trend = fv[-1] - fv[0]
         trend_direction = "increasing" if forecast_trend > 0 else "decreasing" if forecast_trend < 0 else "stable"
         
-        # Prepare forecast table data (limit to 20 rows for PDF readability)
+        # Prepare forecast table data (limit to 20 rows for PDF readability); the values
+        # are formatted here in one pass so the template loop only interpolates strings
         max_table_rows = 20
-        if len(forecast_results["forecast_dates"]) > max_table_rows:
-            forecast_table = list(zip(
-                forecast_results["forecast_dates"][:max_table_rows], 
-                forecast_results["forecast_values"][:max_table_rows]
-            ))
-            table_truncated = True
-        else:
-            forecast_table = list(zip(
-                forecast_results["forecast_dates"], 
-                forecast_results["forecast_values"]
-            ))
-            table_truncated = False
+        table_truncated = len(forecast_results["forecast_dates"]) > max_table_rows
+        forecast_table = [
+            (date, f"{value:.2f}")
+            for date, value in zip(forecast_results["forecast_dates"][:max_table_rows],
+                                   forecast_results["forecast_values"][:max_table_rows])
+        ]
         
-        # Render the HTML template
-        template = env.get_template('report_template.html')
-        html_content = template.render(
+        # Render the HTML template, or hand back Jinja's chunk generator when streaming
+        render = _REPORT_TEMPLATE.generate if stream else _REPORT_TEMPLATE.render
+        html_content = render(
             product=product,
             days=days,
             current_date=current_date,
             dataset_source=dataset_source,
             order_quantity=forecast_results["order_quantity"],
-            reorder_point="{:.2f}".format(forecast_results["reorder_point"]),
-            safety_stock="{:.2f}".format(forecast_results["safety_stock"]),
-            total_cost="{:.2f}".format(forecast_results["total_cost"]),
-            avg_forecast="{:.2f}".format(avg_forecast),
-            total_forecast="{:.2f}".format(total_forecast),
+            reorder_point=f'{forecast_results["reorder_point"]:.2f}',
+            safety_stock=f'{forecast_results["safety_stock"]:.2f}',
+            total_cost=f'{forecast_results["total_cost"]:.2f}',
+            avg_forecast=f"{avg_forecast:.2f}",
+            total_forecast=f"{total_forecast:.2f}",
             trend_direction=trend_direction,
-            forecast_trend="{:.2f}".format(abs(forecast_trend)),
+            forecast_trend=f"{abs(forecast_trend):.2f}",
             chart_visualization=chart_visualization,
             forecast_table=forecast_table,
             table_truncated=table_truncated
@@ -453,20 +500,42 @@ def generate_html_report(product, days, forecast_results, dataset_source="Defaul
         logger.error(f"Error generating HTML report: {str(e)}")
         raise e
 
+def spool_html(chunks):
+    """
+    Write HTML chunks, UTF-8 encoded, to a spooled temporary file.
+    
+    The file stays in memory up to 1 MB and moves to disk beyond that, so a
+    large report is never held as one Python string.
+    
+    Returns:
+        SpooledTemporaryFile: Binary file positioned at 0
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=1 << 20, mode='w+b')
+    for chunk in chunks:
+        spool.write(chunk.encode('utf-8'))
+    spool.seek(0)
+    return spool
+
 def html_to_pdf(html_content):
     """
     Convert HTML content to a PDF file using xhtml2pdf
     
     Args:
-        html_content (str): HTML content to convert
+        html_content (str or file): HTML content to convert, or a binary file
+            of UTF-8 encoded HTML such as the one returned by spool_html
         
     Returns:
         BytesIO: PDF file as BytesIO object
     """
     result = BytesIO()
-    pdf_status = pisa.CreatePDF(html_content, dest=result)
+    pdf_status = pisa.CreatePDF(html_content, dest=result, encoding='utf-8')
+    failed = pdf_status.err
+    
+    # pisa's context keeps the parsed document and its story alive; release it,
+    # and this frame's reference to the source, before the buffer is returned
+    del pdf_status, html_content
     
-    if pdf_status.err:
+    if failed:
         logger.error("Error converting HTML to PDF")
         raise Exception("Error converting HTML to PDF")
     
@@ -482,13 +551,22 @@ def generate_pdf_report(product, days, forecast_results, dataset_source="Default
         days (int): Number of forecast days
         forecast_results (dict): Dictionary with forecast data and metrics
         dataset_source (str): Source of the dataset used
-        use_html (bool): Whether to use the HTML-based approach or direct ReportLab
+        use_html (bool): Whether to use the HTML-based approach or direct ReportLab;
+            forecasts over HTML_REPORT_MAX_DAYS use ReportLab when matplotlib is available
         
     Returns:
         BytesIO: PDF report as a BytesIO object
     """
+    if use_html and len(forecast_results["forecast_values"]) > HTML_REPORT_MAX_DAYS and platypus_chart_available():
+        use_html = False
+    
     if use_html:
-        html_content = generate_html_report(product, days, forecast_results, dataset_source)
-        return html_to_pdf(html_content)
+        # The template is rendered chunk by chunk into a spooled file that pisa
+        # reads; the file is closed as soon as the conversion returns, so the
+        # HTML is never kept alongside the returned PDF
+        with spool_html(generate_html_report(product, days, forecast_results, dataset_source,
+                                             stream=True)) as html_file:
+            pdf_buffer = html_to_pdf(html_file)
+        return pdf_buffer
     else:
         return create_forecast_report_platypus(product, days, forecast_results, dataset_source)
\ No newline at end of file
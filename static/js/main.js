@@ -88,6 +88,29 @@ document.addEventListener('DOMContentLoaded', function() {
     });
   }
   
+  // Render the uploaded dataset preview from its JSON records
+  const previewTable = document.getElementById('preview-table');
+  if (previewTable) {
+    const rows = JSON.parse(previewTable.dataset.preview || '[]');
+    if (rows.length > 0) {
+      const columns = Object.keys(rows[0]);
+      const headerRow = previewTable.createTHead().insertRow();
+      columns.forEach(column => {
+        const th = document.createElement('th');
+        th.textContent = column;
+        headerRow.appendChild(th);
+      });
+      
+      const body = previewTable.createTBody();
+      rows.forEach(row => {
+        const tr = body.insertRow();
+        columns.forEach(column => {
+          tr.insertCell().textContent = row[column];
+        });
+      });
+    }
+  }
+  
   // Initialize form submissions to show loading indicator
   const forms = document.querySelectorAll('form');
   forms.forEach(form => {
@@ -0,0 +1,14 @@
+import os
+
+def ensure_private_dir(directory):
+    """Creates directory if needed, refusing one other users can access.
+
+    Raises OSError unless directory is a real directory (not a symlink),
+    owned by the current user, with no group or other permissions.
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.lstat(directory)
+    if (not os.path.isdir(directory) or os.path.islink(directory)
+            or (hasattr(os, 'getuid') and st.st_uid != os.getuid())
+            or st.st_mode & 0o077):
+        raise OSError(f"{directory} is not a private directory owned by this user")